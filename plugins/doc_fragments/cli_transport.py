@@ -0,0 +1,23 @@
+# Copyright: (c) 2019, Matthew Spera <speramatthew@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+class ModuleDocFragment(object):
+    '''CLI transport options'''
+
+    DOCUMENTATION = r'''
+options:
+    transport:
+        description:
+            - CLI transport backend used to talk to the PAN-OS device.
+            - C(asyncssh) multiplexes CLI channels over a single asyncio SSH connection.
+        choices: ['netmiko', 'asyncssh']
+        default: 'netmiko'
+    channels:
+        description:
+            - Maximum number of concurrent CLI sessions (netmiko) or channels on one connection (asyncssh).
+        type: int
+        default: 4
+'''
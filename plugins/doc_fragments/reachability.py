@@ -0,0 +1,44 @@
+# Copyright: (c) 2019, Matthew Spera <speramatthew@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+class ModuleDocFragment(object):
+    '''Reachability probe and circuit breaker options'''
+
+    DOCUMENTATION = r'''
+options:
+    probe_timeout:
+        description:
+            - Seconds to wait for a TCP connection to port 22 or 443 of the device before giving up on it, 0 to skip the probe.
+        type: float
+        default: 3
+    circuit_breaker:
+        description:
+            - Remember devices that failed the reachability probe, and fail later tasks against them immediately
+              until I(circuit_breaker_cooldown) has passed.
+        type: bool
+        default: False
+    circuit_breaker_file:
+        description:
+            - Local state file shared by all module invocations to track unreachable devices.
+            - Defaults to panos_circuit_breaker.json in the system temporary directory.
+        type: path
+    circuit_breaker_threshold:
+        description:
+            - Number of consecutive failed probes after which the circuit breaker for a device opens.
+        type: int
+        default: 1
+    circuit_breaker_cooldown:
+        description:
+            - Seconds for which a device stays marked unreachable, at most.
+        type: int
+        default: 300
+    circuit_breaker_retry:
+        description:
+            - Seconds between re-probes of a device marked unreachable, so a device back up before
+              I(circuit_breaker_cooldown) expires is used again straight away. 0 to never re-probe.
+        type: int
+        default: 30
+'''
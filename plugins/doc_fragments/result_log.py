@@ -0,0 +1,27 @@
+# Copyright: (c) 2019, Matthew Spera <speramatthew@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+class ModuleDocFragment(object):
+    '''JSON lines result log options'''
+
+    DOCUMENTATION = r'''
+options:
+    result_log:
+        description:
+            - File to append structured results to, one JSON object per line.
+            - Safe to share between modules and concurrent forks, appends are atomic and locked.
+        type: path
+    result_log_max_bytes:
+        description:
+            - Size in bytes past which I(result_log) is rotated, 0 to never rotate.
+        type: int
+        default: 10485760
+    result_log_backups:
+        description:
+            - Number of rotated I(result_log) files to keep.
+        type: int
+        default: 5
+'''
@@ -0,0 +1,22 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.errors import AnsibleFilterError
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_interfaces import interface_state_map, interfaces_up
+
+def interface_state_map_filter(interfaces, logical=True):
+    '''Index 'show interface all' or 'show interface hardware' output,
+    as returned by from_json, by interface name'''
+    if not isinstance(interfaces, dict):
+        raise AnsibleFilterError('Object not a dict.')
+
+    return interface_state_map(interfaces, logical=logical)
+
+class FilterModule(object):
+    ''' PAN interface filters '''
+
+    def filters(self):
+        return {
+            "interface_state_map": interface_state_map_filter,
+            "interfaces_up": interfaces_up
+        }
\ No newline at end of file
@@ -0,0 +1,219 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import re
+import time
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils.six.moves import queue
+
+try:
+    from netmiko import ConnectHandler
+    from netmiko import NetMikoTimeoutException, NetMikoAuthenticationException
+
+    HAS_NETMIKO = True
+except ImportError:
+    HAS_NETMIKO = False
+
+CLI_TRANSPORTS = ['netmiko', 'asyncssh']
+
+# Matches the trailing operational (>) or configuration (#) prompt, e.g. admin@PA-VM(active)>
+PROMPT_PATTERN = r'\S+@\S+[>#]\s*$'
+
+# Interval at which stream callbacks are polled while the device is silent
+STREAM_POLL_INTERVAL = 0.2
+
+CLI_TRANSPORT_ARGUMENT_SPEC = dict(
+    transport=dict(default='netmiko', choices=CLI_TRANSPORTS),
+    channels=dict(type='int', default=4)
+)
+
+class CliTransportError(Exception):
+    '''Raised by a CLI transport when connecting to or talking to the device fails'''
+
+class CliTransport(object):
+    '''Interface shared by the CLI transport backends. A transport holds a
+    single authenticated SSH session to a PAN-OS device'''
+
+    def send_command(self, command, expect_string=None):
+        raise NotImplementedError
+
+    def send_command_timing(self, command, delay_factor=1):
+        raise NotImplementedError
+
+    def send_commands(self, commands, expect_string=None):
+        '''Run several operational commands and return their output in the
+        same order. Backends able to multiplex the session run them
+        concurrently; the default runs them one after the other'''
+        return [self.send_command(command, expect_string=expect_string) for command in commands]
+
+    def stream_command(self, command, on_line):
+        '''Run an operational command, passing each line of output to
+        on_line() as it arrives. on_line() is also called with None while
+        the device is silent. As soon as on_line() returns True the command
+        is interrupted with Ctrl-C. Returns the output read'''
+        raise NotImplementedError
+
+    def stream_commands(self, commands, callbacks):
+        '''stream_command() for several commands, each with its own callback.
+        Backends able to multiplex the session run them concurrently'''
+        return [self.stream_command(command, on_line) for command, on_line in zip(commands, callbacks)]
+
+    def config_mode(self):
+        raise NotImplementedError
+
+    def exit_config_mode(self):
+        raise NotImplementedError
+
+    def disconnect(self):
+        raise NotImplementedError
+
+class NetmikoTransport(CliTransport):
+    '''Blocking transport backed by netmiko. send_commands() runs commands
+    concurrently over a pool of up to `channels` sessions, one thread each'''
+
+    def __init__(self, ip_address, username, password, channels=1):
+        self._auth = {
+            'device_type' : 'paloalto_panos',
+            'ip' : ip_address,
+            'username' : username,
+            'password' : password
+        }
+        self._channels = max(1, channels)
+        self._conn = self._open_session()
+        self._pool = [self._conn]
+
+    def _open_session(self, *args):
+        try:
+            return ConnectHandler(**self._auth)
+        except (NetMikoTimeoutException, NetMikoAuthenticationException) as e:
+            raise CliTransportError(str(e))
+
+    def _send(self, conn, command, expect_string=None):
+        try:
+            if expect_string:
+                return conn.send_command(command, expect_string=expect_string)
+            return conn.send_command(command)
+        except (NetMikoTimeoutException, IOError) as e:
+            raise CliTransportError(str(e))
+
+    def send_command(self, command, expect_string=None):
+        return self._send(self._conn, command, expect_string=expect_string)
+
+    def _stream(self, conn, command, on_line):
+        conn.write_channel(command + conn.RETURN)
+        prompt = re.compile(PROMPT_PATTERN)
+        output = []
+        pending = ''
+        echoed = False
+
+        while True:
+            pending += conn.read_channel().replace('\r', '')
+            lines = pending.split('\n')
+            pending = lines.pop()
+
+            for line in lines:
+                if not echoed and command in line:
+                    echoed = True
+                    continue
+                output.append(line)
+                if on_line(line):
+                    return self._interrupt(conn, output)
+
+            if prompt.search(pending):
+                return '\n'.join(output)
+
+            if on_line(None):
+                return self._interrupt(conn, output)
+
+            time.sleep(STREAM_POLL_INTERVAL)
+
+    def _interrupt(self, conn, output):
+        conn.write_channel('\x03')
+        try:
+            tail = conn.read_until_pattern(pattern=PROMPT_PATTERN).replace('\r', '')
+        except (NetMikoTimeoutException, IOError) as e:
+            raise CliTransportError(str(e))
+        output.extend(line for line in tail.splitlines()[:-1] if line.strip() != '^C')
+
+        # The command may have completed just before Ctrl-C arrived, in which case the device
+        # answers it with a second prompt. Drain it so the next command on this session starts clean
+        while True:
+            time.sleep(STREAM_POLL_INTERVAL)
+            if not conn.read_channel():
+                break
+
+        return '\n'.join(output)
+
+    def _map_sessions(self, func, items):
+        '''Call func(conn, item) for each item, spread over up to `channels`
+        pooled sessions, and return the results in order'''
+        items = list(items)
+        size = min(self._channels, len(items))
+        if size <= 1:
+            return [func(self._conn, item) for item in items]
+
+        threads = ThreadPool(size)
+        try:
+            self._pool.extend(threads.map(self._open_session, range(size - len(self._pool))))
+
+            idle = queue.Queue()
+            for conn in self._pool[:size]:
+                idle.put(conn)
+
+            def run(item):
+                conn = idle.get()
+                try:
+                    return func(conn, item)
+                finally:
+                    idle.put(conn)
+
+            return threads.map(run, items)
+        finally:
+            threads.close()
+
+    def send_commands(self, commands, expect_string=None):
+        return self._map_sessions(
+            lambda conn, command: self._send(conn, command, expect_string=expect_string),
+            commands
+        )
+
+    def stream_command(self, command, on_line):
+        return self._stream(self._conn, command, on_line)
+
+    def stream_commands(self, commands, callbacks):
+        return self._map_sessions(
+            lambda conn, item: self._stream(conn, item[0], item[1]),
+            zip(commands, callbacks)
+        )
+
+    def send_command_timing(self, command, delay_factor=1):
+        return self._conn.send_command_timing(command, delay_factor=delay_factor)
+
+    def config_mode(self):
+        self._conn.config_mode()
+
+    def exit_config_mode(self):
+        self._conn.exit_config_mode()
+
+    def disconnect(self):
+        for conn in self._pool:
+            conn.disconnect()
+
+def missing_cli_lib(transport):
+    '''Return the name of the library backing the transport if it is not
+    installed, else None'''
+    if transport == 'asyncssh':
+        from ansible_collections.mattspera.panos.plugins.module_utils.panos_cli_async import HAS_ASYNCSSH
+        return None if HAS_ASYNCSSH else 'asyncssh'
+
+    return None if HAS_NETMIKO else 'netmiko'
+
+def cli_connect(transport, ip_address, username, password, channels=4):
+    '''Open a CLI session to a PAN-OS device using the requested transport
+    backend. Raises CliTransportError if the connection fails'''
+    if transport == 'asyncssh':
+        from ansible_collections.mattspera.panos.plugins.module_utils.panos_cli_async import AsyncSSHTransport
+        return AsyncSSHTransport(ip_address, username, password, channels=channels)
+
+    return NetmikoTransport(ip_address, username, password, channels=channels)
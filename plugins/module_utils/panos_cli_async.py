@@ -0,0 +1,201 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import re
+import asyncio
+from collections import deque
+
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_cli import (
+    CliTransport, CliTransportError, PROMPT_PATTERN, STREAM_POLL_INTERVAL
+)
+
+try:
+    import asyncssh
+
+    HAS_ASYNCSSH = True
+except ImportError:
+    HAS_ASYNCSSH = False
+
+CONFIG_PROMPT_PATTERN = r'\S+@\S+#\s*$'
+
+class _Shell(object):
+    '''A single interactive CLI channel multiplexed over the shared SSH connection'''
+
+    def __init__(self, process):
+        self._process = process
+
+    async def read_until(self, pattern, timeout):
+        regex = re.compile(pattern)
+        output = ''
+        while not regex.search(output):
+            chunk = await asyncio.wait_for(self._process.stdout.read(65536), timeout)
+            if not chunk:
+                raise CliTransportError('CLI channel closed by device')
+            output += chunk.replace('\r', '')
+        return output
+
+    async def send(self, command, pattern, timeout):
+        self._process.stdin.write(command + '\n')
+        output = await self.read_until(pattern, timeout)
+
+        lines = output.splitlines()
+        if lines and command in lines[0]:
+            lines = lines[1:]
+        if lines and re.search(PROMPT_PATTERN, lines[-1]):
+            lines = lines[:-1]
+        return '\n'.join(lines)
+
+    async def stream(self, command, on_line, timeout):
+        self._process.stdin.write(command + '\n')
+        prompt = re.compile(PROMPT_PATTERN)
+        output = []
+        pending = ''
+        echoed = False
+
+        while True:
+            try:
+                chunk = await asyncio.wait_for(self._process.stdout.read(65536), STREAM_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                chunk = None
+            else:
+                if not chunk:
+                    raise CliTransportError('CLI channel closed by device')
+                pending += chunk.replace('\r', '')
+
+            lines = pending.split('\n')
+            pending = lines.pop()
+
+            for line in lines:
+                if not echoed and command in line:
+                    echoed = True
+                    continue
+                output.append(line)
+                if on_line(line):
+                    return await self._interrupt(output, timeout)
+
+            if prompt.search(pending):
+                return '\n'.join(output)
+
+            if chunk is None and on_line(None):
+                return await self._interrupt(output, timeout)
+
+    async def _interrupt(self, output, timeout):
+        self._process.stdin.write('\x03')
+        tail = await self.read_until(PROMPT_PATTERN, timeout)
+        output.extend(line for line in tail.splitlines()[:-1] if line.strip() != '^C')
+
+        # The command may have completed just before Ctrl-C arrived, in which case the device
+        # answers it with a second prompt. Drain it so the next command on this channel starts clean
+        while True:
+            try:
+                chunk = await asyncio.wait_for(self._process.stdout.read(65536), STREAM_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                raise CliTransportError('CLI channel closed by device')
+
+        return '\n'.join(output)
+
+    def close(self):
+        self._process.close()
+
+class AsyncSSHTransport(CliTransport):
+    '''Transport backed by a single asyncssh connection. Commands passed to
+    send_commands() are spread over up to `channels` interactive CLI channels
+    opened on that connection, so many commands run concurrently without a
+    thread or a login per session'''
+
+    def __init__(self, ip_address, username, password, channels=4, timeout=60):
+        self._channels = max(1, channels)
+        self._timeout = timeout
+        self._pool = []
+        self._loop = asyncio.new_event_loop()
+
+        try:
+            self._conn = self._run(asyncssh.connect(
+                ip_address,
+                username=username,
+                password=password,
+                known_hosts=None
+            ))
+            self._pool.append(self._run(self._open_shell()))
+        except CliTransportError:
+            self._loop.close()
+            raise
+        except OSError as e:
+            self._loop.close()
+            raise CliTransportError(str(e))
+
+    def _run(self, coro):
+        try:
+            return self._loop.run_until_complete(coro)
+        except asyncio.TimeoutError:
+            raise CliTransportError('Timed out waiting for device response')
+        except asyncssh.Error as e:
+            raise CliTransportError(str(e))
+
+    async def _open_shell(self):
+        process = await self._conn.create_process(term_type='vt100', term_size=(511, 24))
+        shell = _Shell(process)
+        await shell.read_until(PROMPT_PATTERN, self._timeout)
+        # Same session preparation netmiko applies for paloalto_panos
+        await shell.send('set cli scripting-mode on', PROMPT_PATTERN, self._timeout)
+        await shell.send('set cli pager off', PROMPT_PATTERN, self._timeout)
+        return shell
+
+    async def _map_shells(self, func, items):
+        '''Await func(shell, item) for each item, spread over up to `channels`
+        CLI channels, and return the results in order'''
+        size = min(self._channels, len(items))
+        while len(self._pool) < size:
+            self._pool.append(await self._open_shell())
+
+        output = [None] * len(items)
+        pending = deque(enumerate(items))
+
+        async def worker(shell):
+            while pending:
+                index, item = pending.popleft()
+                output[index] = await func(shell, item)
+
+        await asyncio.gather(*[worker(shell) for shell in self._pool[:size]])
+        return output
+
+    def send_command(self, command, expect_string=None):
+        return self._run(self._pool[0].send(command, expect_string or PROMPT_PATTERN, self._timeout))
+
+    def send_command_timing(self, command, delay_factor=1):
+        return self._run(self._pool[0].send(command, PROMPT_PATTERN, self._timeout * delay_factor))
+
+    def send_commands(self, commands, expect_string=None):
+        if not commands:
+            return []
+        return self._run(self._map_shells(
+            lambda shell, command: shell.send(command, expect_string or PROMPT_PATTERN, self._timeout),
+            list(commands)
+        ))
+
+    def stream_command(self, command, on_line):
+        return self._run(self._pool[0].stream(command, on_line, self._timeout))
+
+    def stream_commands(self, commands, callbacks):
+        items = list(zip(commands, callbacks))
+        if not items:
+            return []
+        return self._run(self._map_shells(
+            lambda shell, item: shell.stream(item[0], item[1], self._timeout),
+            items
+        ))
+
+    def config_mode(self):
+        self._run(self._pool[0].send('configure', CONFIG_PROMPT_PATTERN, self._timeout))
+
+    def exit_config_mode(self):
+        self._run(self._pool[0].send('exit', PROMPT_PATTERN, self._timeout))
+
+    def disconnect(self):
+        for shell in self._pool:
+            shell.close()
+        self._conn.close()
+        self._loop.run_until_complete(self._conn.wait_closed())
+        self._loop.close()
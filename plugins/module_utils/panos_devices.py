@@ -0,0 +1,151 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import ast
+
+from ansible.module_utils.six import string_types
+
+try:
+    import xmltodict
+
+    HAS_XMLTODICT = True
+except ImportError:
+    HAS_XMLTODICT = False
+
+def _as_list(value):
+    '''xmltodict returns a dict for a single entry and None for no entries'''
+    if not value:
+        return []
+    if isinstance(value, dict):
+        return [value]
+    return value
+
+def _literal(value):
+    '''Untyped module parameters arrive as the string form of the baseline fact'''
+    if isinstance(value, string_types):
+        return ast.literal_eval(value)
+    return value
+
+def _entries(result, container):
+    if not result or not result.get(container):
+        return []
+    return _as_list(result[container].get('entry'))
+
+class DeviceIndexError(Exception):
+    '''Raised by the tests of an index whose device status could not be fetched'''
+
+class ManagedDeviceIndex(object):
+    '''Status of every Panorama managed device, fetched in one pass and
+    indexed by serial number, answering the device connected, template
+    sync and shared policy sync tests with constant-time lookups'''
+
+    def __init__(self, devices_all, devicegroups, templates, device=None, connect=None):
+        self.device = device
+        self.connect = connect
+        self.error = None
+        self._index(devices_all, devicegroups, templates)
+
+    def _index(self, devices_all, devicegroups, templates):
+        self.hostnames = {}
+        self.connected = set()
+        self.template_status = {}
+        self.shared_policy_status = {}
+
+        for entry in _entries(devices_all, 'devices'):
+            self.hostnames[entry['serial']] = entry.get('hostname')
+            if entry.get('connected') == 'yes':
+                self.connected.add(entry['serial'])
+
+        self.serials = dict((hostname, serial) for serial, hostname in self.hostnames.items())
+
+        for dg in _entries(devicegroups, 'devicegroups'):
+            for device in _as_list((dg.get('devices') or {}).get('entry')):
+                for vsys in _as_list((device.get('vsys') or {}).get('entry')):
+                    key = (dg['@name'], device['serial'], vsys['@name'])
+                    self.shared_policy_status[key] = vsys.get('shared-policy-status')
+
+        for template in _entries(templates, 'templates'):
+            for device in _as_list((template.get('devices') or {}).get('entry')):
+                self.template_status[(template['@name'], device['serial'])] = device.get('template-status')
+
+    @staticmethod
+    def _fetch(device):
+        def op(cmd):
+            return xmltodict.parse(device.op(cmd, xml=True))['response']['result']
+
+        return op('show devices all'), op('show devicegroups'), op('show templates')
+
+    @classmethod
+    def from_device(cls, device):
+        '''Build the index from a pandevice Panorama object'''
+        return cls(*cls._fetch(device), device=device)
+
+    @classmethod
+    def deferred(cls, connect, error):
+        '''Empty index for a Panorama that could not be queried yet. Its
+        tests raise error until refresh() has connected with connect() and
+        fetched the device status'''
+        index = cls(None, None, None, connect=connect)
+        index.error = error
+        return index
+
+    def refresh(self):
+        '''Re-fetch device status from the Panorama the index was built from'''
+        if self.device is None and self.connect:
+            self.device = self.connect()
+
+        if self.device:
+            self._index(*self._fetch(self.device))
+            self.error = None
+
+    def _check(self):
+        if self.error:
+            raise DeviceIndexError(self.error)
+
+    def t_devices_connected(self, bl_devices_connected):
+        self._check()
+
+        connected_hostnames = set(self.hostnames[serial] for serial in self.connected)
+        not_connected = set(bl_devices_connected) - connected_hostnames
+
+        return {
+            'name': 't_devices_connected',
+            'result': not not_connected,
+            'info': {'devices_not_connected': sorted(not_connected)}
+        }
+
+    def t_template_sync(self, bl_template_sync):
+        self._check()
+
+        changed = {}
+
+        for template, devices in _literal(bl_template_sync).items():
+            for serial, bl_status in devices.items():
+                status = self.template_status.get((template, serial))
+                if status != bl_status:
+                    changed.setdefault(template, {})[serial] = [bl_status, status]
+
+        return {
+            'name': 't_template_sync',
+            'result': not changed,
+            'info': {'changed': changed}
+        }
+
+    def t_shared_policy_sync(self, bl_shared_policy_sync):
+        self._check()
+
+        changed = {}
+
+        for dg, devices in _literal(bl_shared_policy_sync).items():
+            for hostname, vsys_status in devices.items():
+                serial = self.serials.get(hostname)
+                for vsys, bl_status in vsys_status.items():
+                    status = self.shared_policy_status.get((dg, serial, vsys))
+                    if status != bl_status:
+                        changed.setdefault(dg, {}).setdefault(hostname, {})[vsys] = [bl_status, status]
+
+        return {
+            'name': 't_shared_policy_sync',
+            'result': not changed,
+            'info': {'changed': changed}
+        }
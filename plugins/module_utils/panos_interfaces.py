@@ -0,0 +1,63 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+try:
+    import xmltodict
+except ImportError:
+    # Only t_interface_state() needs xmltodict, callers check for it before running the test
+    pass
+
+def _as_list(value):
+    '''xmltodict returns a dict for a single entry and None for no entries'''
+    if not value:
+        return []
+    if isinstance(value, dict):
+        return [value]
+    return value
+
+def interface_state_map(interfaces, logical=True):
+    '''Parse 'show interface all' output, as converted by xmltodict, into a
+    dict of interface name to state in a single pass. Logical interfaces
+    take the state of their parent hardware interface, 'unknown' if it has
+    none. With logical=False only hardware interfaces are mapped, as in
+    'show interface hardware' output'''
+    if 'response' in interfaces:
+        interfaces = interfaces['response']['result']
+
+    state_map = {}
+
+    for entry in _as_list((interfaces.get('hw') or {}).get('entry')):
+        state_map[entry['name']] = entry.get('state')
+
+    if logical:
+        for entry in _as_list((interfaces.get('ifnet') or {}).get('entry')):
+            if entry['name'] not in state_map:
+                state_map[entry['name']] = state_map.get(entry['name'].split('.')[0]) or 'unknown'
+
+    return state_map
+
+def interfaces_up(state_map, logical=True):
+    '''Sorted names of the interfaces in an 'up' state. Logical interfaces,
+    named <parent>.<unit>, are left out with logical=False'''
+    return sorted(
+        name for name, state in state_map.items() if state == 'up' and (logical or '.' not in name)
+    )
+
+def t_interface_state(device, bl_interface_state):
+    '''Compare the current state of every interface with the baseline state
+    map. Reported as t_interfaces_up, listing the interfaces that were up
+    at baseline and no longer are'''
+    state_map = interface_state_map(xmltodict.parse(device.op('show interface all', xml=True)))
+
+    interfaces_down = set(interfaces_up(bl_interface_state)) - set(interfaces_up(state_map))
+
+    return {
+        'name': 't_interfaces_up',
+        'result': not interfaces_down,
+        'info': {
+            'interfaces_down': sorted(interfaces_down),
+            'changed': dict(
+                (name, [bl_interface_state[name], state_map.get(name)]) for name in sorted(interfaces_down)
+            )
+        }
+    }
@@ -0,0 +1,119 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import re
+import time
+
+RE_PING_REPLY = re.compile(r'bytes from .*icmp_seq=(\d+)')
+# Any other line naming a sequence number is an ICMP error, e.g. Destination Net Unreachable
+RE_PING_SEQ = re.compile(r'icmp_seq=(\d+)')
+RE_PING_STATS = re.compile(r'(\d+) packets transmitted, (\d+) (?:packets )?received.*?(\d+(?:\.\d+)?)% packet loss')
+RE_PING_RTT = re.compile(r'min/avg/max(?:/mdev)? = ([\d.]+)/([\d.]+)/([\d.]+)')
+RE_PING_SOURCE_ERROR = re.compile(r'(bind)')
+RE_PING_HOST_ERROR = re.compile(r'(unknown)')
+
+def ping_command(host, source=None, size=None, count=2):
+    '''Build a PAN-OS operational ping command'''
+    command = 'ping '
+
+    if source:
+        command += 'source ' + source + ' '
+
+    if size:
+        command += 'size ' + str(size) + ' '
+
+    command += 'count ' + str(count) + ' host ' + host
+
+    return command
+
+def parse_ping(raw_text_ping):
+    '''Parse the output of a PAN-OS ping command into packet and round-trip
+    time statistics. RTT values are None when no reply was received, error
+    is None unless the ping could not be run at all'''
+    stats = {
+        'sent': None,
+        'received': None,
+        'loss': None,
+        'rtt_min': None,
+        'rtt_avg': None,
+        'rtt_max': None,
+        'error': None
+    }
+
+    re_search_stats = RE_PING_STATS.search(raw_text_ping)
+
+    if re_search_stats:
+        stats['sent'] = int(re_search_stats.group(1))
+        stats['received'] = int(re_search_stats.group(2))
+        stats['loss'] = float(re_search_stats.group(3))
+
+        re_search_rtt = RE_PING_RTT.search(raw_text_ping)
+        if re_search_rtt:
+            stats['rtt_min'] = float(re_search_rtt.group(1))
+            stats['rtt_avg'] = float(re_search_rtt.group(2))
+            stats['rtt_max'] = float(re_search_rtt.group(3))
+    elif RE_PING_SOURCE_ERROR.search(raw_text_ping):
+        stats['error'] = 'invalid source address'
+    elif RE_PING_HOST_ERROR.search(raw_text_ping):
+        stats['error'] = 'unknown host'
+    else:
+        stats['error'] = 'unknown error'
+
+    return stats
+
+class PingLossEvaluator(object):
+    '''Decides a streaming ping against a packet-loss threshold as output
+    arrives. Requests are assumed to be sent every `interval` seconds and a
+    request counts as lost once `reply_timeout` seconds have passed since it
+    was sent without a reply, a later request has already been answered, or
+    an ICMP error such as Destination Net Unreachable was returned for it.
+    feed() returns True as soon as the outcome can no longer change and the
+    ping is worth interrupting, i.e. not every request has been answered yet,
+    as a ping with all its replies in exits by itself'''
+
+    def __init__(self, count, max_loss, interval=1.0, reply_timeout=2.0, clock=time.time):
+        self.count = count
+        self.max_lost = int(count * max_loss / 100.0)
+        self.interval = interval
+        self.reply_timeout = reply_timeout
+        self.clock = clock
+        self.replies = set()
+        self.errors = set()
+        self.lost = 0
+        self.started = None
+        self.verdict = None
+        self.interrupted = False
+
+    def feed(self, line):
+        if self.started is None:
+            self.started = self.clock()
+
+        if line:
+            re_search_reply = RE_PING_REPLY.search(line)
+            re_search_seq = RE_PING_SEQ.search(line)
+            if re_search_reply:
+                self.replies.add(int(re_search_reply.group(1)))
+            elif re_search_seq:
+                self.errors.add(int(re_search_seq.group(1)))
+
+        elapsed = self.clock() - self.started
+        expired = int((elapsed - self.reply_timeout) / self.interval) + 1 if elapsed >= self.reply_timeout else 0
+        settled = min(self.count, max([expired] + [seq - 1 for seq in self.replies] + list(self.errors)))
+        self.lost = len([seq for seq in range(1, settled + 1) if seq not in self.replies])
+
+        if self.lost > self.max_lost:
+            self.verdict = 'fail'
+        elif len(self.replies) >= self.count - self.max_lost:
+            self.verdict = 'pass'
+
+        self.interrupted = self.verdict is not None and len(self.replies | self.errors) < self.count
+        return self.interrupted
+
+    def stats(self):
+        '''Packet statistics observed so far, in the same form as parse_ping()'''
+        sent = min(self.count, len(self.replies) + self.lost)
+        return {
+            'sent': sent,
+            'received': len(self.replies),
+            'loss': round(100.0 * self.lost / sent, 1) if sent else 0.0
+        }
@@ -0,0 +1,178 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import json
+import time
+import errno
+import fcntl
+import socket
+import tempfile
+
+# Ports probed before connecting, SSH for the CLI modules and HTTPS for the API
+REACHABILITY_PORTS = (22, 443)
+
+REACHABILITY_ARGUMENT_SPEC = dict(
+    probe_timeout=dict(type='float', default=3),
+    circuit_breaker=dict(type='bool', default=False),
+    circuit_breaker_file=dict(type='path', default=os.path.join(tempfile.gettempdir(), 'panos_circuit_breaker.json')),
+    circuit_breaker_threshold=dict(type='int', default=1),
+    circuit_breaker_cooldown=dict(type='int', default=300),
+    circuit_breaker_retry=dict(type='int', default=30)
+)
+
+def probe(host, ports=REACHABILITY_PORTS, timeout=3):
+    '''Try a TCP connection to each port in turn. Return None as soon as
+    the device answers, even with a refused connection, else a description
+    of why every port failed'''
+    errors = []
+
+    for port in ports:
+        try:
+            sock = socket.create_connection((host, port), timeout)
+        except socket.timeout:
+            errors.append('tcp/{}: timed out'.format(port))
+        except (socket.error, OSError) as e:
+            if e.errno == errno.ECONNREFUSED:
+                return None
+            errors.append('tcp/{}: {}'.format(port, e))
+        else:
+            sock.close()
+            return None
+
+    return ', '.join(errors)
+
+class CircuitBreaker(object):
+    '''Per-host circuit breaker persisted in a local JSON state file, so a
+    device found unreachable by one task is failed immediately by the tasks
+    that follow, across module invocations and forks, until `cooldown`
+    seconds have passed. Every `retry` seconds during the cooldown one
+    attempt is let through to re-probe the device, closing the breaker as
+    soon as it is back. The file is locked for every read-modify-write'''
+
+    def __init__(self, path, threshold=1, cooldown=300, retry=30, clock=time.time):
+        self.path = path
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.retry = retry
+        self.clock = clock
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as file_obj:
+                fcntl.flock(file_obj, fcntl.LOCK_SH)
+                return json.loads(file_obj.read() or '{}')
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _update(self, func):
+        with open(self.path, 'a+') as file_obj:
+            fcntl.flock(file_obj, fcntl.LOCK_EX)
+            try:
+                file_obj.seek(0)
+                try:
+                    state = json.loads(file_obj.read() or '{}')
+                except ValueError:
+                    state = {}
+
+                value = func(state)
+
+                file_obj.seek(0)
+                file_obj.truncate()
+                json.dump(state, file_obj)
+                return value
+            finally:
+                fcntl.flock(file_obj, fcntl.LOCK_UN)
+
+    def open_reason(self, host):
+        '''Return why the breaker for host is open, else None. Once the
+        cooldown has expired, or a re-probe is due, the attempt is let through'''
+        entry = self._read().get(host)
+
+        if not entry or entry.get('opened_at') is None:
+            return None
+
+        remaining = entry['opened_at'] + self.cooldown - self.clock()
+        if remaining <= 0:
+            return None
+
+        if self._retry_due(entry) and self._claim_retry(host):
+            return None
+
+        return 'Device {} marked unreachable {}s ago ({}), skipping for another {}s'.format(
+            host, int(self.clock() - entry['opened_at']), entry['reason'], int(remaining)
+        )
+
+    def _retry_due(self, entry):
+        return self.retry > 0 and self.clock() - entry.get('probed_at', entry['opened_at']) >= self.retry
+
+    def _claim_retry(self, host):
+        '''Take the re-probe slot for host under the exclusive lock, so only
+        one caller per retry interval gets to probe the device'''
+        def claim(state):
+            entry = state.get(host)
+            if not entry or entry.get('opened_at') is None or not self._retry_due(entry):
+                return False
+            entry['probed_at'] = self.clock()
+            return True
+
+        return self._update(claim)
+
+    def record_failure(self, host, reason):
+        def fail(state):
+            entry = state.setdefault(host, {'failures': 0, 'opened_at': None, 'reason': None})
+            entry['failures'] += 1
+            entry['reason'] = reason
+            entry['probed_at'] = self.clock()
+            if entry['failures'] >= self.threshold:
+                entry['opened_at'] = self.clock()
+
+        self._update(fail)
+
+    def record_success(self, host):
+        # Avoid taking the write lock on every run for healthy devices
+        if host not in self._read():
+            return
+
+        def reset(state):
+            state.pop(host, None)
+
+        self._update(reset)
+
+def ensure_reachable(module, host=None):
+    '''Fail the module straight away if the device is known to be
+    unreachable, or does not answer a TCP probe on REACHABILITY_PORTS'''
+    host = host or module.params['ip_address']
+    breaker = None
+
+    if module.params['circuit_breaker']:
+        breaker = CircuitBreaker(
+            module.params['circuit_breaker_file'],
+            threshold=module.params['circuit_breaker_threshold'],
+            cooldown=module.params['circuit_breaker_cooldown'],
+            retry=module.params['circuit_breaker_retry']
+        )
+
+        try:
+            reason = breaker.open_reason(host)
+        except (IOError, OSError) as e:
+            module.warn('Unable to update circuit breaker state file: {}'.format(e))
+            reason = None
+
+        if reason:
+            module.fail_json(msg=reason, reachable=False)
+
+    if module.params['probe_timeout'] > 0:
+        error = probe(host, timeout=module.params['probe_timeout'])
+
+        if breaker:
+            try:
+                if error:
+                    breaker.record_failure(host, error)
+                else:
+                    breaker.record_success(host)
+            except (IOError, OSError) as e:
+                module.warn('Unable to update circuit breaker state file: {}'.format(e))
+
+        if error:
+            module.fail_json(msg='Device {} unreachable: {}'.format(host, error), reachable=False)
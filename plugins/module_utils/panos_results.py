@@ -0,0 +1,93 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import json
+import time
+import fcntl
+
+RESULT_SINK_ARGUMENT_SPEC = dict(
+    result_log=dict(type='path'),
+    result_log_max_bytes=dict(type='int', default=10 * 1024 * 1024),
+    result_log_backups=dict(type='int', default=5)
+)
+
+def _json_default(obj):
+    if isinstance(obj, set):
+        return sorted(obj)
+    raise TypeError
+
+class ResultSink(object):
+    '''JSON lines result file shared by every module and fork. Records are
+    buffered in memory and flushed with a single append while holding an
+    exclusive lock on a companion .lock file, so concurrent writers never
+    interleave. The file is rotated to path.1 .. path.<backups> once it
+    would grow past max_bytes'''
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._buffer = []
+
+    def emit(self, module_name, device, record):
+        entry = {'timestamp': round(time.time(), 3), 'module': module_name, 'device': device}
+        entry.update(record)
+        self._buffer.append(json.dumps(entry, separators=(',', ':'), sort_keys=True, default=_json_default))
+
+    def _rotate(self):
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+
+        for index in range(self.backups - 1, 0, -1):
+            src = '{}.{}'.format(self.path, index)
+            if os.path.exists(src):
+                os.rename(src, '{}.{}'.format(self.path, index + 1))
+
+        os.rename(self.path, '{}.1'.format(self.path))
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        data = ('\n'.join(self._buffer) + '\n').encode('utf-8')
+
+        with open(self.path + '.lock', 'a') as lock_obj:
+            fcntl.flock(lock_obj, fcntl.LOCK_EX)
+            try:
+                if (
+                    self.max_bytes > 0 and
+                    os.path.exists(self.path) and
+                    os.path.getsize(self.path) + len(data) > self.max_bytes
+                ):
+                    self._rotate()
+
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+            finally:
+                fcntl.flock(lock_obj, fcntl.LOCK_UN)
+
+        self._buffer = []
+
+def emit_results(module, module_name, records):
+    '''Append one JSON line per record to the module's result_log, if set'''
+    if not module.params['result_log']:
+        return
+
+    sink = ResultSink(
+        module.params['result_log'],
+        max_bytes=module.params['result_log_max_bytes'],
+        backups=module.params['result_log_backups']
+    )
+
+    for record in records:
+        sink.emit(module_name, module.params['ip_address'], record)
+
+    try:
+        sink.flush()
+    except (IOError, OSError) as e:
+        module.warn('Unable to write results to {}: {}'.format(module.params['result_log'], e))
@@ -0,0 +1,165 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import json
+import time
+from collections import OrderedDict
+
+# Declared relative cost in seconds of each test, keyed by module parameter
+DEFAULT_TEST_COSTS = {
+    'test_ha_peer_up_pano': 1,
+    'test_ha_match_pano': 1,
+    'test_ha_config_synced_pano': 1,
+    'test_system_env_alarms_pano': 1,
+    'test_ha_peer_up': 1,
+    'test_ha_match': 1,
+    'test_ha_config_synced': 1,
+    'test_system_env_alarms_fw': 1,
+    'test_panorama_connected': 1,
+    'test_ha_enabled': 1,
+    'test_system_version': 1,
+    'test_devices_connected': 3,
+    'test_log_collectors_connected': 3,
+    'test_wf_appliances_connected': 3,
+    'test_log_collector_config_sync': 3,
+    'test_wf_appliance_config_sync': 3,
+    'test_interfaces_up': 3,
+    'test_interface_state': 3,
+    'test_template_sync': 5,
+    'test_shared_policy_sync': 5,
+    'test_routes': 5,
+    'test_traffic_log_forward': 10,
+    'test_connectivity': 30,
+    'test_config_diff': 60
+}
+
+DEFAULT_CRITICAL_TESTS = ['test_ha_peer_up', 'test_ha_peer_up_pano', 'test_panorama_connected']
+
+# Weight given to the latest measurement when updating the stored cost of a test
+COST_SMOOTHING = 0.5
+
+def load_test_costs(path):
+    '''Load measured test costs, an empty dict if none were stored yet or
+    the file does not hold a dict'''
+    try:
+        with open(path, 'r') as file_obj:
+            costs = json.load(file_obj)
+    except (IOError, OSError, ValueError):
+        return {}
+
+    return costs if isinstance(costs, dict) else {}
+
+def save_test_costs(path, durations):
+    '''Blend the durations of this run into the measured test costs'''
+    costs = load_test_costs(path)
+
+    for param, seconds in durations.items():
+        if param in costs:
+            costs[param] = round(COST_SMOOTHING * seconds + (1 - COST_SMOOTHING) * costs[param], 3)
+        else:
+            costs[param] = round(seconds, 3)
+
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as file_obj:
+        json.dump(costs, file_obj)
+    os.rename(tmp_path, path)
+
+def schedule_tests(params, critical_tests, costs):
+    '''Order tests critical first, then cheapest first. Tests without a
+    known cost run last, ties keep their requested order'''
+    return sorted(params, key=lambda param: (param not in critical_tests, costs.get(param, float('inf'))))
+
+def run_tests(tests, order, critical_tests=(), fail_fast=False, catch_errors=False, clock=time.time):
+    '''Run tests in the given order, timing each one. With fail_fast, stop
+    as soon as a critical test fails. With catch_errors, a test raising an
+    exception is recorded as failed with the error in its info, so it can
+    be watched, rather than aborting the run. Returns the outputs and
+    durations keyed like tests, in run order, and the tests that were
+    skipped'''
+    test_outputs = OrderedDict()
+    durations = OrderedDict()
+
+    for index, param in enumerate(order):
+        started = clock()
+        try:
+            test_outputs[param] = tests[param]()
+        except Exception as e:
+            if not catch_errors:
+                raise
+            test_outputs[param] = {'name': param, 'result': False, 'info': {'error': str(e)}}
+        durations[param] = clock() - started
+
+        if fail_fast and param in critical_tests and not test_outputs[param]['result']:
+            return test_outputs, durations, list(order[index + 1:])
+
+    return test_outputs, durations, []
+
+def watch_tests(tests, test_outputs, timeout, interval, max_interval, before_retry=None, clock=time.time, sleep=time.sleep):
+    '''Re-run failing tests until they pass or `timeout` seconds expire.
+    The wait between attempts starts at `interval` and doubles up to
+    `max_interval`, shortened so the last attempt lands on the deadline.
+    test_outputs is updated in place with the latest output of each test.
+    before_retry() is called once ahead of every round of re-runs.
+    Returns the convergence of each test keyed like tests'''
+    started = clock()
+    convergence = OrderedDict()
+
+    for param, output in test_outputs.items():
+        convergence[param] = {
+            'converged': bool(output['result']),
+            'seconds': 0.0 if output['result'] else None,
+            'attempts': 1,
+            'error': None
+        }
+
+    failing = [param for param, output in test_outputs.items() if not output['result']]
+
+    while failing:
+        remaining = timeout - (clock() - started)
+        if remaining <= 0:
+            break
+
+        sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+        if before_retry:
+            try:
+                before_retry()
+            except Exception as e:
+                # Device may still be unreachable while it settles
+                for param in failing:
+                    convergence[param]['attempts'] += 1
+                    convergence[param]['error'] = str(e)
+                continue
+
+        for param in list(failing):
+            convergence[param]['attempts'] += 1
+
+            try:
+                test_outputs[param] = tests[param]()
+            except Exception as e:
+                convergence[param]['error'] = str(e)
+                continue
+
+            convergence[param]['error'] = None
+
+            if test_outputs[param]['result']:
+                convergence[param]['converged'] = True
+                convergence[param]['seconds'] = round(clock() - started, 1)
+                failing.remove(param)
+
+    return convergence
+
+def summarize_tests(test_outputs, skipped_tests=()):
+    '''Small overview of a test-suite run, failed tests listed by parameter
+    name in run order'''
+    failed = [param for param, output in test_outputs.items() if not output['result']]
+
+    return {
+        'total': len(test_outputs) + len(skipped_tests),
+        'passed': len(test_outputs) - len(failed),
+        'failed': len(failed),
+        'skipped': len(skipped_tests),
+        'failed_tests': failed
+    }
@@ -20,6 +20,7 @@ description:
     
 requirements:
     - netmiko can be obtained from PyPi (https://pypi.org/project/netmiko)
+    - asyncssh can be obtained from PyPi (https://pypi.org/project/asyncssh), if using the asyncssh transport
 
 options:
     ip_address:
@@ -39,6 +40,11 @@ options:
         type: bool
         default: False
 
+extends_documentation_fragment:
+    - mattspera.panos.cli_transport
+    - mattspera.panos.reachability
+    - mattspera.panos.result_log
+
 author:
     - Matthew Spera (@mattspera)
 '''
@@ -57,14 +63,11 @@ import json
 from datetime import datetime
 
 from ansible.module_utils.basic import AnsibleModule
-
-try:
-    from netmiko import ConnectHandler
-    from netmiko import NetMikoTimeoutException, NetMikoAuthenticationException
-
-    HAS_LIB = True
-except ImportError:
-    HAS_LIB = False
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_cli import (
+    CLI_TRANSPORT_ARGUMENT_SPEC, CliTransportError, cli_connect, missing_cli_lib
+)
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_results import RESULT_SINK_ARGUMENT_SPEC, emit_results
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_reachability import REACHABILITY_ARGUMENT_SPEC, ensure_reachable
 
 def run_module():
     module_args = dict(
@@ -73,6 +76,9 @@ def run_module():
         password=dict(no_log=True),
         save=dict(type='bool', default=False)
     )
+    module_args.update(CLI_TRANSPORT_ARGUMENT_SPEC)
+    module_args.update(REACHABILITY_ARGUMENT_SPEC)
+    module_args.update(RESULT_SINK_ARGUMENT_SPEC)
 
     result = dict(
         changed=False,
@@ -85,20 +91,22 @@ def run_module():
         #support_check_mode=False
     )
 
-    if not HAS_LIB:
-        module.fail_json(msg='Missing required libraries: netmiko')
+    missing_lib = missing_cli_lib(module.params['transport'])
+    if missing_lib:
+        module.fail_json(msg='Missing required libraries: {}'.format(missing_lib))
 
-    auth = {
-        'device_type' : 'paloalto_panos',
-        'ip' : module.params['ip_address'],
-        'username' : module.params['username'],
-        'password' : module.params['password']    
-    }
+    ensure_reachable(module)
 
     try:
-        conn = ConnectHandler(**auth)
-    except (NetMikoTimeoutException, NetMikoAuthenticationException) as e:
-        module.fail_json(msg=e)
+        conn = cli_connect(
+            module.params['transport'],
+            module.params['ip_address'],
+            module.params['username'],
+            module.params['password'],
+            channels=module.params['channels']
+        )
+    except CliTransportError as e:
+        module.fail_json(msg=str(e))
 
     conn.send_command('set cli config-output-format set')
     conn.config_mode()
@@ -120,6 +128,11 @@ def run_module():
 
     conn.disconnect()
 
+    emit_results(module, 'panos_config_set', [{
+        'config_lines': len(running_config_set.splitlines()),
+        'saved_to': result['config_set'] if module.params['save'] else None
+    }])
+
     module.exit_json(**result)
 
 def main():
@@ -0,0 +1,222 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2019, Matthew Spera <speramatthew@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: panos_op_fanout
+
+short_description: Run operational commands on Panorama managed firewalls through the Panorama API proxy.
+
+description:
+    - Run operational commands on Panorama managed firewalls through the Panorama API proxy.
+    - Commands are targeted by firewall serial number over a single authenticated Panorama API session,
+      so managed firewalls do not need to be logged in to individually.
+    - Firewalls are queried concurrently, with the overall request rate capped.
+
+requirements:
+    - pandevice can be obtained from PyPi (https://pypi.org/project/pandevice)
+    - xmltodict can be obtained from PyPi (https://pypi.org/project/xmltodict)
+
+options:
+    ip_address:
+        description:
+            - IP address or hostname of Panorama.
+        required: true
+    username:
+        description:
+            - Username for authentication for Panorama.
+        default: 'admin'
+    password:
+        description:
+            - Password for authentication for Panorama.
+    serials:
+        description:
+            - Serial numbers of the managed firewalls to run the commands on.
+            - Defaults to every firewall returned by 'show devices connected'.
+        type: list
+    commands:
+        description:
+            - Operational commands to run on each firewall.
+        type: list
+        default: ['show system info', 'show panorama-status', 'show interface hardware', 'show routing route']
+    workers:
+        description:
+            - Number of firewalls queried concurrently.
+        type: int
+        default: 10
+    rate_limit:
+        description:
+            - Maximum number of API requests per second sent to Panorama, 0 for no limit.
+        type: float
+        default: 10
+
+extends_documentation_fragment:
+    - mattspera.panos.reachability
+    - mattspera.panos.result_log
+
+author:
+    - Matthew Spera (@mattspera)
+'''
+
+EXAMPLES = '''
+# Collect baseline operational state of every connected firewall through Panorama
+- name: Fan-out baseline of managed firewalls
+  panos_op_fanout:
+    ip_address: 192.168.0.254
+    username: admin
+    password: admin
+    workers: 20
+    rate_limit: 15
+  register: fanout_result
+'''
+
+RETURN = '''
+devices:
+    description:
+        - Dictionary keyed by firewall serial number.
+        - Each value holds the firewall hostname, the parsed result of each command keyed by command, and an error
+          message if the firewall could not be queried.
+failed_serials:
+    description: Serial numbers of the firewalls that could not be queried.
+    type: list
+message:
+    description: The output message generated.
+'''
+
+import ssl
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_results import RESULT_SINK_ARGUMENT_SPEC, emit_results
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_reachability import REACHABILITY_ARGUMENT_SPEC, ensure_reachable
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_throttle import RateLimiter
+
+# To disable ssl certificate verification (required for Centos7/RHEL - Python 2.7.5)
+try:
+    _create_unverified_https_context = ssl._create_unverified_context
+except AttributeError:
+# Legacy Python that doesn't verify HTTPS certificates by default
+    pass
+else:
+# Handle target environment that doesn't support HTTPS verification
+    ssl._create_default_https_context = _create_unverified_https_context
+
+try:
+    from pandevice.panorama import Panorama
+    from pandevice.firewall import Firewall
+    from pandevice.errors import PanDeviceError
+    import xmltodict
+
+    HAS_LIB = True
+except ImportError:
+    HAS_LIB = False
+
+def connected_devices(pano):
+    '''Return a dict of serial to hostname for each firewall connected to Panorama'''
+    devices_dict = xmltodict.parse(pano.op('show devices connected', xml=True))['response']['result']['devices']
+
+    if not devices_dict:
+        return {}
+
+    entries = devices_dict['entry']
+    if isinstance(entries, dict):
+        entries = [entries]
+
+    return dict((entry['serial'], entry.get('hostname')) for entry in entries)
+
+def run_module():
+    module_args = dict(
+        ip_address=dict(required=True),
+        username=dict(default='admin'),
+        password=dict(no_log=True),
+        serials=dict(type='list'),
+        commands=dict(type='list', default=['show system info', 'show panorama-status', 'show interface hardware', 'show routing route']),
+        workers=dict(type='int', default=10),
+        rate_limit=dict(type='float', default=10)
+    )
+    module_args.update(REACHABILITY_ARGUMENT_SPEC)
+    module_args.update(RESULT_SINK_ARGUMENT_SPEC)
+
+    result = dict(
+        changed=False,
+        devices={},
+        failed_serials=[],
+        message=''
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        #support_check_mode=False
+    )
+
+    if not HAS_LIB:
+        module.fail_json(msg='Missing required libraries: pandevice, xmltodict')
+
+    ensure_reachable(module)
+
+    pano = Panorama(
+        module.params['ip_address'],
+        module.params['username'],
+        module.params['password']
+    )
+
+    try:
+        # Single keygen, every proxied request below reuses this API key
+        pano.api_key
+        hostnames = connected_devices(pano)
+    except PanDeviceError as e:
+        module.fail_json(msg=str(e))
+
+    serials = module.params['serials'] or list(hostnames)
+
+    firewalls = []
+    for serial in serials:
+        fw = Firewall(serial=serial)
+        pano.add(fw)
+        firewalls.append(fw)
+
+    limiter = RateLimiter(module.params['rate_limit'])
+
+    def query(fw):
+        device = {'hostname': hostnames.get(fw.serial), 'commands': {}, 'error': None}
+
+        for cmd in module.params['commands']:
+            limiter.acquire()
+            try:
+                device['commands'][cmd] = xmltodict.parse(fw.op(cmd, xml=True))['response']['result']
+            except PanDeviceError as e:
+                device['error'] = '{}: {}'.format(cmd, e)
+                break
+
+        return fw.serial, device
+
+    if firewalls:
+        threads = ThreadPool(max(1, min(module.params['workers'], len(firewalls))))
+        try:
+            result['devices'] = dict(threads.map(query, firewalls))
+        finally:
+            threads.close()
+
+    result['failed_serials'] = sorted(serial for serial, device in result['devices'].items() if device['error'])
+    emit_results(module, 'panos_op_fanout', [
+        {'serial': serial, 'hostname': device['hostname'], 'error': device['error']}
+        for serial, device in result['devices'].items()
+    ])
+
+    result['message'] = 'Queried {} firewalls through Panorama, {} failed'.format(len(firewalls), len(result['failed_serials']))
+
+    module.exit_json(**result)
+
+def main():
+    run_module()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -13,14 +13,16 @@ DOCUMENTATION = '''
 ---
 module: panos_ping
 
-short_description: Ping specific host from a PAN FW.
+short_description: Ping specific hosts from a PAN FW.
 
 description:
     - Ping specific host from a PAN FW.
+    - Multiple targets can be pinged concurrently over pooled CLI sessions, returning parsed packet and RTT statistics per target.
     
 requirements:
     - netmiko can be obtained from PyPi (https://pypi.org/project/netmiko)
     - ipaddress can be obtained from PyPi (https://pypi.org/project/ipaddress)
+    - asyncssh can be obtained from PyPi (https://pypi.org/project/asyncssh), if using the asyncssh transport
 
 options:
     ip_address:
@@ -37,7 +39,26 @@ options:
     host:
         description:
             - Hostname or IP address of remote host.
-        required: true
+            - Mutually exclusive with I(targets), one of the two is required.
+    targets:
+        description:
+            - List of remote hosts to ping concurrently.
+            - Each target may set its own I(source) and I(size), otherwise the module level values are used.
+            - Mutually exclusive with I(host).
+        type: list
+        elements: dict
+        suboptions:
+            host:
+                description:
+                    - Hostname or IP address of remote host.
+                required: true
+            source:
+                description:
+                    - Source address of echo request.
+            size:
+                description:
+                    - Size of request packets (0..65468 bytes).
+                type: int
     source:
         description:
             - Source address of echo request.
@@ -53,6 +74,28 @@ options:
     log:
         description:
             - File path to dump ping test results.
+    stream:
+        description:
+            - Read ping output line by line and evaluate I(max_loss) as replies arrive.
+            - The ping is interrupted as soon as the result is decided, either pass or fail.
+        type: bool
+        default: False
+    max_loss:
+        description:
+            - Highest packet loss percentage still considered a pass.
+        type: float
+        default: 0
+    reply_timeout:
+        description:
+            - Seconds after which an unanswered echo request is counted as lost in I(stream) mode.
+        type: float
+        default: 2
+
+extends_documentation_fragment:
+    - mattspera.panos.cli_transport
+    - mattspera.panos.reachability
+    - mattspera.panos.result_log
+
 author:
     - Matthew Spera (@mattspera)
 '''
@@ -88,23 +131,83 @@ EXAMPLES = '''
     count: 10
     size: 80
     log: /home/admin/log/ping_test.log
+
+# Ping host 1000 times, stopping as soon as more than 5% loss is seen or can no longer be reached
+- name: Ping host in streaming mode
+  panos_ping:
+    ip_address: 192.168.0.250
+    username: admin
+    password: admin
+    host: 10.0.1.10
+    count: 1000
+    stream: True
+    max_loss: 5
+
+# Ping several hosts concurrently, each with its own source
+- name: Ping multiple hosts
+  panos_ping:
+    ip_address: 192.168.0.250
+    username: admin
+    password: admin
+    count: 5
+    targets:
+      - host: 10.0.1.10
+        source: 10.0.1.1
+      - host: 10.0.2.10
+        source: 10.0.2.1
+        size: 1400
 '''
 
 RETURN = '''
 packet_loss:
-    description: After performing the ping test, returns the packet loss percentage.
+    description: After performing the ping test, returns the packet loss percentage. Only set when pinging a single I(host).
+results:
+    description: Parsed statistics for each target pinged.
+    type: list
+    contains:
+        host:
+            description: Remote host pinged.
+        command:
+            description: Ping command issued.
+        sent:
+            description: Number of echo requests sent.
+        received:
+            description: Number of echo replies received.
+        loss:
+            description: Packet loss percentage as a number.
+        rtt_min:
+            description: Minimum round-trip time in ms, null if no reply was received.
+        rtt_avg:
+            description: Average round-trip time in ms, null if no reply was received.
+        rtt_max:
+            description: Maximum round-trip time in ms, null if no reply was received.
+        error:
+            description: Reason the ping could not be run, null on success.
+        verdict:
+            description: Either 'pass' or 'fail' against I(max_loss), null if the ping could not be run.
+        aborted:
+            description: Whether the ping was interrupted early in I(stream) mode because its verdict was decided.
+passed:
+    description: Whether every target met the I(max_loss) threshold.
+    type: bool
 message:
     description: The output message generated.
 '''
 
-import re
 from datetime import datetime
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils._text import to_text
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_cli import (
+    CLI_TRANSPORT_ARGUMENT_SPEC, CliTransportError, cli_connect, missing_cli_lib
+)
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_ping_utils import (
+    PingLossEvaluator, ping_command, parse_ping
+)
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_results import RESULT_SINK_ARGUMENT_SPEC, emit_results
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_reachability import REACHABILITY_ARGUMENT_SPEC, ensure_reachable
 
 try:
     import ipaddress
-    from netmiko import ConnectHandler
-    from netmiko import NetMikoTimeoutException, NetMikoAuthenticationException
     
     HAS_LIB = True
 except ImportError:
@@ -116,79 +219,143 @@ def run_module():
         username = dict(default='admin'),
         password = dict(no_log=True),
         source = dict(),
-        host = dict(required=True),
+        host = dict(),
+        targets = dict(
+            type='list',
+            elements='dict',
+            options=dict(
+                host = dict(required=True),
+                source = dict(),
+                size = dict(type='int')
+            )
+        ),
         count = dict(type='int', default=2),
         size = dict(type='int'),
-        log = dict()
+        log = dict(),
+        stream = dict(type='bool', default=False),
+        max_loss = dict(type='float', default=0),
+        reply_timeout = dict(type='float', default=2)
     )
+    module_args.update(CLI_TRANSPORT_ARGUMENT_SPEC)
+    module_args.update(REACHABILITY_ARGUMENT_SPEC)
+    module_args.update(RESULT_SINK_ARGUMENT_SPEC)
 
     result = dict(
         changed=False,
         command='',
         packet_loss='',
+        results=[],
+        passed=False,
         message=''
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[['host', 'targets']],
+        required_one_of=[['host', 'targets']],
         supports_check_mode=False
     )
     if not HAS_LIB:
-        module.fail_json(msg='Missing required library: netmiko and/or ipaddress')
-        
-    auth = {
-        'device_type' : 'paloalto_panos',
-        'ip' : module.params['ip_address'],
-        'username' : module.params['username'],
-        'password' : module.params['password']    
-    }
+        module.fail_json(msg='Missing required library: ipaddress')
+
+    missing_lib = missing_cli_lib(module.params['transport'])
+    if missing_lib:
+        module.fail_json(msg='Missing required library: {}'.format(missing_lib))
+
+    if module.params['targets'] is not None and not module.params['targets']:
+        module.fail_json(msg='targets must contain at least one target')
+
+    ensure_reachable(module)
+
+    if module.params['targets'] is not None:
+        targets = module.params['targets']
+    else:
+        targets = [dict(host=module.params['host'], source=None, size=None)]
+
+    commands = []
+
+    for target in targets:
+        target['source'] = target['source'] or module.params['source']
+        target['size'] = target['size'] or module.params['size']
+
+        if target['source']:
+            try:
+                ipaddress.ip_address(to_text(target['source']))
+            except ValueError:
+                module.fail_json(msg='Invalid source address: {}'.format(target['source']))
+
+        commands.append(ping_command(target['host'], target['source'], target['size'], module.params['count']))
 
     try:
-        conn = ConnectHandler(**auth)
-    except (NetMikoTimeoutException, NetMikoAuthenticationException) as e:
-        module.fail_json(msg=e)
+        conn = cli_connect(
+            module.params['transport'],
+            module.params['ip_address'],
+            module.params['username'],
+            module.params['password'],
+            channels=module.params['channels']
+        )
+    except CliTransportError as e:
+        module.fail_json(msg=str(e))
 
-        
-    command = 'ping '
-    
-    if module.params['source'] and ipaddress.ip_address(module.params['source']):
-        command += 'source ' + module.params['source'] + ' '
-        
-    if module.params['size']:
-        command += 'size ' + str(module.params['size']) + ' '
-        
-    command += 'count ' + str(module.params['count']) + ' host ' + module.params['host']
-    result['command'] = command
+    evaluators = [
+        PingLossEvaluator(module.params['count'], module.params['max_loss'], reply_timeout=module.params['reply_timeout'])
+        for command in commands
+    ]
 
     try:        
-        raw_text_ping = conn.send_command(command, expect_string='(unknown)|(syntax)|(bind)|(\d{1,3})%').strip('ping\n')
-    except NetMikoTimeoutException as e:
-        module.fail_json(msg=e)
+        if module.params['stream']:
+            raw_text_pings = conn.stream_commands(commands, [evaluator.feed for evaluator in evaluators])
+        else:
+            raw_text_pings = conn.send_commands(commands)
+    except CliTransportError as e:
+        module.fail_json(msg=str(e))
+
+    conn.disconnect()
+
+    raw_text_pings = [raw_text_ping.strip('ping\n') for raw_text_ping in raw_text_pings]
+
+    for target, command, raw_text_ping, evaluator in zip(targets, commands, raw_text_pings, evaluators):
+        ping_result = dict(host=target['host'], source=target['source'], size=target['size'], command=command)
+        ping_result.update(parse_ping(raw_text_ping))
+        ping_result['aborted'] = evaluator.interrupted
+
+        if ping_result['aborted']:
+            # Interrupted pings may not print their statistics summary
+            if ping_result['sent'] is None:
+                ping_result.update(evaluator.stats())
+                ping_result['error'] = None
+            ping_result['verdict'] = evaluator.verdict
+        elif ping_result['error']:
+            ping_result['verdict'] = None
+        else:
+            ping_result['verdict'] = 'pass' if ping_result['loss'] <= module.params['max_loss'] else 'fail'
+
+        result['results'].append(ping_result)
+
+    result['passed'] = all(ping_result['verdict'] == 'pass' for ping_result in result['results'])
       
     if module.params['log']:
         with open(module.params['log'], 'a+') as f:
-            f.write('==============================================================\n')
-            f.write('HOST: ' + module.params['ip_address'] + '\nTIMESTAMP: ' + datetime.now().strftime('%d/%m/%y %H:%M.%S') + '\n\n')
-            f.write('CMD:\n\n' + command + '\n\nRESULT:\n' + raw_text_ping + '\n')
-            f.write('==============================================================\n')
-            f.write('==============================================================\n\n')
+            for command, raw_text_ping in zip(commands, raw_text_pings):
+                f.write('==============================================================\n')
+                f.write('HOST: ' + module.params['ip_address'] + '\nTIMESTAMP: ' + datetime.now().strftime('%d/%m/%y %H:%M.%S') + '\n\n')
+                f.write('CMD:\n\n' + command + '\n\nRESULT:\n' + raw_text_ping + '\n')
+                f.write('==============================================================\n')
+                f.write('==============================================================\n\n')
         result['message'] = 'Ping test complete, results output to ' + module.params['log']
     else:
         result['message'] = 'Ping test complete, no logging of results'
-        
-    re_search_success = re.search(r'(\d{1,3})%', raw_text_ping)
-    re_search_source_error = re.search(r'(bind)', raw_text_ping)
-    re_search_host_error = re.search(r'(unknown)', raw_text_ping)
-    #re_search_syntax_error = re.search('(syntax)', raw_text_ping)
-    
-    if re_search_success:
-        result['packet_loss'] = re_search_success.group(0)
-    elif re_search_source_error:
-        module.fail_json(msg='Ping test failed due to invalid source address')
-    elif re_search_host_error:
-        module.fail_json(msg='Ping test failed due to unknown host')
-    else:
-        module.fail_json(msg='Ping test failed due to unknown error')
+
+    emit_results(module, 'panos_ping', result['results'])
+
+    if module.params['host']:
+        ping_result = result['results'][0]
+        result['command'] = ping_result['command']
+
+        if ping_result['error']:
+            module.fail_json(msg='Ping test failed due to ' + ping_result['error'])
+
+        result['packet_loss'] = '{:g}%'.format(ping_result['loss'])
                
     module.exit_json(**result)
 
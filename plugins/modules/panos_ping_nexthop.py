@@ -18,10 +18,12 @@ short_description: Ping the nexthop of each route in routing table from a PAN fi
 description:
     - Ping the nexthop of each route in routing table from a PAN firewall.
     - Return packet-loss percentage results.
+    - In incremental mode, only next-hops that are new or changed since the baseline are pinged first.
     
 requirements:
     - netmiko can be obtained from PyPi (https://pypi.org/project/netmiko)
     - pandevice can be obtained from PyPi (https://pypi.org/project/pandevice)
+    - asyncssh can be obtained from PyPi (https://pypi.org/project/asyncssh), if using the asyncssh transport
 
 options:
     ip_address:
@@ -35,17 +37,85 @@ options:
     password:
         description:
             - Password for authentication for PAN-OS device.
+    mode:
+        description:
+            - C(full) pings every active next-hop.
+            - C(incremental) compares the current route and interface tables with I(baseline_route_table),
+              I(baseline_sources) and I(baseline_connectivity), pings new or changed next-hops first and unchanged
+              next-hops afterwards, or skips unchanged next-hops while the baseline is within I(freshness_ttl).
+        choices: ['full', 'incremental']
+        default: 'full'
+    baseline_route_table:
+        description:
+            - Route table entries retrieved during baseline of device (bl_route_table).
+            - Required when I(mode=incremental).
+        type: list
+    baseline_connectivity:
+        description:
+            - Dictionary of packet-loss percentage per next-hop retrieved during baseline of device (bl_connectivity).
+            - Required when I(mode=incremental).
+        type: dict
+    baseline_sources:
+        description:
+            - Dictionary of ping source address per next-hop retrieved during baseline of device (bl_connectivity_sources),
+              as returned in I(sources).
+            - A next-hop whose source address differs, or is missing, counts as changed.
+              Without it every next-hop counts as changed.
+        type: dict
+    baseline_timestamp:
+        description:
+            - Epoch time at which I(baseline_connectivity) was collected, as returned in I(timestamp).
+        type: float
+    freshness_ttl:
+        description:
+            - Seconds for which baseline packet-loss results of unchanged next-hops are reused instead of pinging them again.
+            - 0 always pings unchanged next-hops, after the new or changed ones.
+        type: int
+        default: 0
+
+extends_documentation_fragment:
+    - mattspera.panos.cli_transport
+    - mattspera.panos.reachability
+    - mattspera.panos.result_log
 
 author:
     - Matthew Spera (@mattspera)
 '''
 
 EXAMPLES = '''
+# Ping only next-hops that changed since the baseline, reusing baseline results up to an hour old
+- name: Incremental next-hop reachability
+  panos_ping_nexthop:
+    ip_address: 192.168.0.250
+    username: admin
+    password: admin
+    mode: incremental
+    baseline_route_table: '{{ bl_facts.bl_route_table }}'
+    baseline_connectivity: '{{ bl_facts.bl_connectivity }}'
+    baseline_sources: '{{ bl_facts.bl_connectivity_sources }}'
+    baseline_timestamp: '{{ bl_facts.bl_connectivity_timestamp }}'
+    freshness_ttl: 3600
 '''
 
 RETURN = '''
 packet_loss:
     description: After performing the ping test, returns the packet-loss percentage.
+changed_nexthops:
+    description:
+        - Next-hops that are new or whose egress interface or source address changed since the baseline, pinged first.
+    type: list
+sources:
+    description: Dictionary of the source address each next-hop is pinged from, to be passed back as I(baseline_sources).
+    type: dict
+skipped:
+    description: Dictionary of next-hops that were not pinged, with the reason for each.
+    type: dict
+timestamp:
+    description:
+        - Epoch time at which the next-hops were pinged, to be passed back as I(baseline_timestamp).
+        - When baseline results of unchanged next-hops were reused, the I(baseline_timestamp) they came from,
+          so chained runs never treat reused results as fresh.
+    type: float
 message:
     description: The output message generated.
 '''
@@ -53,8 +123,16 @@ message:
 import json
 import ssl
 import re
+import time
+from collections import OrderedDict
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_cli import (
+    CLI_TRANSPORT_ARGUMENT_SPEC, CliTransportError, cli_connect, missing_cli_lib
+)
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_ping_utils import ping_command
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_results import RESULT_SINK_ARGUMENT_SPEC, emit_results
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_reachability import REACHABILITY_ARGUMENT_SPEC, ensure_reachable
 
 # To disable ssl certificate verification (required for Centos7/RHEL - Python 2.7.5)
 try:
@@ -69,34 +147,69 @@ else:
 try:
     from pandevice.base import PanDevice
     from pandevice.errors import PanDeviceError
-    from netmiko import ConnectHandler
-    from netmiko import NetMikoTimeoutException, NetMikoAuthenticationException
     import xmltodict
 
     HAS_LIB = True
 except ImportError:
     HAS_LIB = False
 
+def active_nexthops(route_entries):
+    '''Map each unique active, non-connected, non-host next-hop in a route
+    table to its egress interface'''
+    nexthops = OrderedDict()
+
+    for entry in route_entries:
+        if (
+            'A' in entry['flags'] and
+            not 'C' in entry['flags'] and
+            not 'H' in entry['flags'] and
+            entry['nexthop'] != 'discard' and
+            not entry['nexthop'] in nexthops
+        ):
+            nexthops[entry['nexthop']] = entry['interface']
+
+    return nexthops
+
 def run_module():
     module_args = dict(
         ip_address=dict(required=True),
         username=dict(default='admin'),
-        password=dict(no_log=True)
+        password=dict(no_log=True),
+        mode=dict(default='full', choices=['full', 'incremental']),
+        baseline_route_table=dict(type='list'),
+        baseline_connectivity=dict(type='dict'),
+        baseline_sources=dict(type='dict'),
+        baseline_timestamp=dict(type='float'),
+        freshness_ttl=dict(type='int', default=0)
     )
+    module_args.update(CLI_TRANSPORT_ARGUMENT_SPEC)
+    module_args.update(REACHABILITY_ARGUMENT_SPEC)
+    module_args.update(RESULT_SINK_ARGUMENT_SPEC)
 
     result = dict(
         changed=False,
         packet_loss='',
+        changed_nexthops=[],
+        sources={},
+        skipped={},
+        timestamp=None,
         message=''
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
+        required_if=[['mode', 'incremental', ['baseline_route_table', 'baseline_connectivity']]],
         #support_check_mode=False
     )
 
     if not HAS_LIB:
-        module.fail_json(msg='Missing required libraries: pandevice, netmiko, xmltodict')
+        module.fail_json(msg='Missing required libraries: pandevice, xmltodict')
+
+    missing_lib = missing_cli_lib(module.params['transport'])
+    if missing_lib:
+        module.fail_json(msg='Missing required libraries: {}'.format(missing_lib))
+
+    ensure_reachable(module)
 
     try:
         device = PanDevice.create_from_device(
@@ -107,35 +220,21 @@ def run_module():
     except PanDeviceError as e:
         module.fail_json(msg=e.message)
 
-    auth = {
-        'device_type' : 'paloalto_panos',
-        'ip' : module.params['ip_address'],
-        'username' : module.params['username'],
-        'password' : module.params['password']    
-    }
-
     try:
-        conn = ConnectHandler(**auth)
-    except (NetMikoTimeoutException, NetMikoAuthenticationException) as e:
-        module.fail_json(msg=e)
+        conn = cli_connect(
+            module.params['transport'],
+            module.params['ip_address'],
+            module.params['username'],
+            module.params['password'],
+            channels=module.params['channels']
+        )
+    except CliTransportError as e:
+        module.fail_json(msg=str(e))
 
     route_table_dict = xmltodict.parse(device.op('show routing route', xml=True))['response']['result']
     route_interface_dict = xmltodict.parse(device.op('show routing interface', xml=True))['response']['result']
 
-    nexthops = []
-    nexthop_interfaces = []
-
-    if 'entry' in route_table_dict:
-        for entry in route_table_dict['entry']:
-            if (
-                'A' in entry['flags'] and
-                not 'C' in entry['flags'] and
-                not 'H' in entry['flags'] and
-                entry['nexthop'] != 'discard' and
-                not entry['nexthop'] in nexthops
-            ):
-                nexthops.append(entry['nexthop'])
-                nexthop_interfaces.append(entry['interface'])
+    nexthops = active_nexthops(route_table_dict['entry']) if 'entry' in route_table_dict else OrderedDict()
 
     interface_ip_map_dict = {}
 
@@ -146,22 +245,63 @@ def run_module():
             else:
                 interface_ip_map_dict[interface['name']] = ''
 
-    nexthop_interface_ips = []
-
-    for nexthop_int in nexthop_interfaces:
-        for int_name, int_ip in interface_ip_map_dict.items():
-            if nexthop_int == int_name:
-                nexthop_int = int_ip
-                nexthop_interface_ips.append(nexthop_int[:-3])
-                break
-
     packet_loss_dict = {}
+    nexthop_sources = OrderedDict()
 
-    for nexthop, source in list(zip(nexthops, nexthop_interface_ips)):
+    for nexthop, nexthop_int in nexthops.items():
+        source = interface_ip_map_dict.get(nexthop_int, '')[:-3]
         if source:
-            cmd = 'ping source {} count 2 host {}'.format(source, nexthop)
-            raw_text_ping = conn.send_command(cmd, expect_string=r'(unknown)|(syntax)|(bind)|(\d{1,3})%').strip('ping\n')
-            re_packet_loss = re.search(r'(\d{1,3})%', raw_text_ping)
+            nexthop_sources[nexthop] = source
+        else:
+            result['skipped'][nexthop] = 'no source address on egress interface {}'.format(nexthop_int)
+
+    result['sources'] = dict(nexthop_sources)
+    ping_batches = [list(nexthop_sources)]
+    reused = False
+
+    if module.params['mode'] == 'incremental':
+        bl_nexthops = active_nexthops(module.params['baseline_route_table'])
+        bl_connectivity = module.params['baseline_connectivity']
+        bl_sources = module.params['baseline_sources'] or {}
+
+        for nexthop in bl_nexthops:
+            if nexthop not in nexthops:
+                result['skipped'][nexthop] = 'no longer in route table'
+
+        result['changed_nexthops'] = [
+            nexthop for nexthop in nexthop_sources
+            if (
+                bl_nexthops.get(nexthop) != nexthops[nexthop] or
+                bl_sources.get(nexthop) != nexthop_sources[nexthop] or
+                nexthop not in bl_connectivity
+            )
+        ]
+        unchanged_nexthops = [nexthop for nexthop in nexthop_sources if nexthop not in result['changed_nexthops']]
+
+        bl_age = time.time() - module.params['baseline_timestamp'] if module.params['baseline_timestamp'] else None
+
+        if bl_age is not None and bl_age <= module.params['freshness_ttl']:
+            for nexthop in unchanged_nexthops:
+                packet_loss_dict[nexthop] = bl_connectivity[nexthop]
+                result['skipped'][nexthop] = 'unchanged since baseline, baseline result {}s old is within freshness ttl'.format(int(bl_age))
+            ping_batches = [result['changed_nexthops']]
+            reused = bool(unchanged_nexthops)
+        else:
+            ping_batches = [result['changed_nexthops'], unchanged_nexthops]
+
+    # Reused baseline results are only as fresh as the baseline they came from
+    result['timestamp'] = module.params['baseline_timestamp'] if reused else time.time()
+
+    for batch in ping_batches:
+        cmds = [ping_command(nexthop, nexthop_sources[nexthop]) for nexthop in batch]
+
+        try:
+            raw_text_pings = conn.send_commands(cmds, expect_string=r'(unknown)|(syntax)|(bind)|(\d{1,3})%')
+        except CliTransportError as e:
+            module.fail_json(msg=str(e))
+
+        for nexthop, raw_text_ping in zip(batch, raw_text_pings):
+            re_packet_loss = re.search(r'(\d{1,3})%', raw_text_ping.strip('ping\n'))
 
             if re_packet_loss:
                 packet_loss_dict[nexthop] = re_packet_loss.group(0)
@@ -170,6 +310,13 @@ def run_module():
     result['message'] = 'Done'
     result['changed'] = True
 
+    emit_results(
+        module,
+        'panos_ping_nexthop',
+        [{'nexthop': nexthop, 'packet_loss': packet_loss} for nexthop, packet_loss in packet_loss_dict.items()] +
+        [{'nexthop': nexthop, 'skipped': reason} for nexthop, reason in result['skipped'].items()]
+    )
+
     conn.disconnect()
 
     module.exit_json(**result)
@@ -20,6 +20,7 @@ description:
     
 requirements:
     - pantest (can be found at https://github.com/mattspera/pantest)
+    - xmltodict can be obtained from PyPi (https://pypi.org/project/xmltodict), if using bulk_device_status
 
 options:
     ip_address:
@@ -39,6 +40,80 @@ options:
             - Log file is creating in working directory.
         type: bool
         default: False
+    bulk_device_status:
+        description:
+            - Answer I(test_devices_connected), I(test_template_sync) and I(test_shared_policy_sync) from a single bulk
+              fetch of 'show devices all', 'show devicegroups' and 'show templates', indexed by device serial number.
+            - Keeps the cost of these Panorama tests flat as the number of managed devices grows.
+        type: bool
+        default: False
+    watch:
+        description:
+            - After the first run, re-run only the failing tests with exponential backoff until they pass or
+              I(watch_timeout) expires.
+            - Intended for post-change checks where HA sync, interfaces or Panorama connectivity take a variable
+              time to settle.
+            - Tests raising an error on the first run, as when the device is not answering yet, are recorded as failed
+              with the error in their info and retried, as is fetching I(bulk_device_status).
+        type: bool
+        default: False
+    watch_timeout:
+        description:
+            - Seconds after the first run within which failing tests must converge in I(watch) mode.
+        type: int
+        default: 600
+    watch_interval:
+        description:
+            - Initial seconds to wait before re-running failing tests in I(watch) mode, doubled after each attempt.
+        type: float
+        default: 5
+    watch_max_interval:
+        description:
+            - Upper bound in seconds on the wait between re-runs in I(watch) mode.
+        type: float
+        default: 60
+    schedule:
+        description:
+            - Run tests in I(critical_tests) first, then the remaining tests cheapest first, instead of in the
+              documented order.
+            - Cost of a test is taken from I(test_costs), else from the durations measured in I(cost_file), else
+              from a declared default.
+        type: bool
+        default: False
+    test_costs:
+        description:
+            - Dictionary of test parameter name to declared cost in seconds, overriding measured and default costs.
+        type: dict
+    cost_file:
+        description:
+            - File in which the measured duration of each test is stored and updated after every run, used by
+              I(schedule) to order tests.
+        type: path
+    critical_tests:
+        description:
+            - Test parameter names whose failure makes running the remaining tests pointless.
+        type: list
+        default: ['test_ha_peer_up', 'test_ha_peer_up_pano', 'test_panorama_connected']
+    fail_fast:
+        description:
+            - Stop running tests as soon as one of I(critical_tests) fails. Tests not run are listed in I(skipped_tests).
+            - In I(watch) mode the skipped tests are run, and watched for the rest of I(watch_timeout), once the
+              critical tests pass.
+            - The test-suite result is 'FAIL' while any test is skipped.
+        type: bool
+        default: False
+    output_format:
+        description:
+            - C(full) returns the output of every test, indented, in I(stdout).
+            - C(compact) returns a I(summary) of the run and only the name and result of each test in I(stdout),
+              without indentation. The full output of every test is written to I(detail_file) instead.
+        choices: ['full', 'compact']
+        default: full
+    detail_file:
+        description:
+            - File the full test output is written to, as a JSON list, in C(compact) I(output_format).
+            - Defaults to <ip_address>_<timestamp>_tvt_detail.json in the working directory.
+        type: path
     test_devices_connected:
         description:
             - Panorama test.
@@ -103,6 +178,14 @@ options:
             - Input parameter retrieved during baseline of device.
             - List containing the names of interfaces in an 'up' state.
         type: list
+    test_interface_state:
+        description:
+            - Firewall test.
+            - Input parameter retrieved during baseline of device.
+            - Dictionary of interface name to state, including logical interfaces, as built by the
+              mattspera.panos.interface_state_map filter from 'show interface all' output.
+            - Interfaces up at baseline and no longer up are reported under the t_interfaces_up test.
+        type: dict
     test_traffic_log_forward:
         description:
             - Firewall test.
@@ -154,6 +237,10 @@ options:
             - String containing either a file path to a file containing the SET command configuration for the device, or
             - String containing the SET comand configuration for the device.
 
+extends_documentation_fragment:
+    - mattspera.panos.reachability
+    - mattspera.panos.result_log
+
 author:
     - Matthew Spera (@mattspera)
 '''
@@ -168,21 +255,98 @@ EXAMPLES = '''
     test_devices_connected: '{{ bl_devices_connected }}'
     test_shared_policy_sync: '{{ bl_shared_policy_sync_dict }}'
     test_template_sync: '{{ bl_template_sync_dict }}'
+    bulk_device_status: True
+
+# Wait up to 15 minutes for HA and interfaces to settle after a failover
+- name: FIREWALL TEST-SUITE WITH CONVERGENCE WATCH
+  panos_test:
+    ip_address: 192.168.0.250
+    username: admin
+    password: admin
+    test_ha_peer_up: up
+    test_ha_config_synced: synchronized
+    test_interfaces_up: '{{ bl_facts.bl_interfaces_up_list }}'
+    watch: True
+    watch_timeout: 900
+
+# Run cheap critical checks first and skip the expensive ones if the HA peer is down
+- name: FIREWALL TEST-SUITE WITH FAIL-FAST SCHEDULING
+  panos_test:
+    ip_address: 192.168.0.250
+    username: admin
+    password: admin
+    test_ha_peer_up: up
+    test_config_diff: '{{ bl_facts.bl_config }}'
+    test_connectivity: '{{ bl_facts.bl_connectivity }}'
+    schedule: True
+    fail_fast: True
+    cost_file: '{{ inventory_hostname }}_test_costs.json'
+
+# Return only a summary, keeping the full output of every test on disk
+- name: FIREWALL TEST-SUITE WITH COMPACT OUTPUT
+  panos_test:
+    ip_address: 192.168.0.250
+    username: admin
+    password: admin
+    test_interfaces_up: '{{ bl_facts.bl_interfaces_up_list }}'
+    test_routes: '{{ bl_facts.bl_route_table }}'
+    output_format: compact
+    detail_file: '{{ inventory_hostname }}_tvt_detail.json'
+
+# Compare the state of every interface, including subinterfaces, with the baseline state map
+- name: FIREWALL INTERFACE STATE TEST
+  panos_test:
+    ip_address: 192.168.0.250
+    username: admin
+    password: admin
+    test_interface_state: '{{ bl_facts.bl_interface_state_map }}'
 '''
 
 RETURN = '''
 stdout:
     description: Test-suite result output.
+convergence:
+    description:
+        - Populated in I(watch) mode. Dictionary keyed by test parameter with whether the test converged, the
+          seconds it took to pass, the number of attempts and the last error raised while re-running it, if any.
+    type: dict
+skipped_tests:
+    description:
+        - Test parameter names not run because a critical test failed in I(fail_fast) mode.
+        - The test-suite result is 'FAIL' while this is not empty.
+    type: list
+durations:
+    description: Dictionary of test parameter name to the seconds its first run took.
+    type: dict
+summary:
+    description:
+        - Populated in C(compact) I(output_format). Number of tests run in total, passed, failed and skipped,
+          and the parameter names of the failed tests.
+    type: dict
+detail_file:
+    description: Populated in C(compact) I(output_format). File the full output of every test was written to.
+    type: str
 message:
     description: Displays the overall result of the test-suite, either a 'PASS' or 'FAIL'.
 '''
 
 import json
 import ssl
+import time
 import logging
+from collections import OrderedDict
 from datetime import datetime
+from functools import partial
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_devices import ManagedDeviceIndex, HAS_XMLTODICT
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_interfaces import t_interface_state
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_results import RESULT_SINK_ARGUMENT_SPEC, emit_results
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_reachability import REACHABILITY_ARGUMENT_SPEC, ensure_reachable
+from ansible_collections.mattspera.panos.plugins.module_utils.panos_testsuite import (
+    DEFAULT_CRITICAL_TESTS, DEFAULT_TEST_COSTS, load_test_costs, run_tests, save_test_costs, schedule_tests, summarize_tests,
+    watch_tests
+)
 
 # To disable ssl certificate verification (required for Centos7/RHEL - Python 2.7.5)
 try:
@@ -198,6 +362,8 @@ try:
     from pantest.testcases import GeneralTestCases
     from pantest.testcases import FirewallTestCases
     from pantest.testcases import PanoramaTestCases
+    from pandevice.base import PanDevice
+    from pandevice.errors import PanDeviceError
 
     HAS_LIB = True
 except ImportError:
@@ -214,6 +380,18 @@ def run_module():
         username=dict(default='admin'),
         password=dict(no_log=True),
         log=dict(type='bool', default=False),
+        bulk_device_status=dict(type='bool', default=False),
+        watch=dict(type='bool', default=False),
+        watch_timeout=dict(type='int', default=600),
+        watch_interval=dict(type='float', default=5),
+        watch_max_interval=dict(type='float', default=60),
+        schedule=dict(type='bool', default=False),
+        test_costs=dict(type='dict'),
+        cost_file=dict(type='path'),
+        critical_tests=dict(type='list', default=DEFAULT_CRITICAL_TESTS),
+        fail_fast=dict(type='bool', default=False),
+        output_format=dict(default='full', choices=['full', 'compact']),
+        detail_file=dict(type='path'),
         test_devices_connected=dict(type='list'),
         test_log_collectors_connected=dict(type='list'),
         test_wf_appliances_connected=dict(type='list'),
@@ -226,6 +404,7 @@ def run_module():
         test_ha_config_synced_pano=dict(),
         test_system_env_alarms_pano=dict(),
         test_interfaces_up=dict(type='list'),
+        test_interface_state=dict(type='dict'),
         test_traffic_log_forward=dict(type='bool'),
         test_panorama_connected=dict(),
         test_ha_peer_up=dict(),
@@ -238,10 +417,17 @@ def run_module():
         test_system_version=dict(),
         test_config_diff=dict()
     )
+    module_args.update(REACHABILITY_ARGUMENT_SPEC)
+    module_args.update(RESULT_SINK_ARGUMENT_SPEC)
 
     result = dict(
         changed=False,
         stdout='',
+        convergence={},
+        skipped_tests=[],
+        durations={},
+        summary={},
+        detail_file='',
         message=''
     )
 
@@ -253,6 +439,8 @@ def run_module():
     if not HAS_LIB:
         module.fail_json(msg='Missing required libraries: pantest')
 
+    ensure_reachable(module)
+
     if module.params['log']:
         # Lowering paramiko logging level to prevent unnecessary logging in main log file
         logging.getLogger('paramiko').setLevel(logging.WARNING)
@@ -270,114 +458,227 @@ def run_module():
     fw_tester = FirewallTestCases(device_info)
     gen_tester = GeneralTestCases(device_info)
 
-    test_output_list = []
+    # Managed device tests are answered by pantest unless bulk device status is enabled
+    device_tester = pano_tester
+
+    if module.params['bulk_device_status'] and (
+        module.params['test_devices_connected'] or
+        module.params['test_shared_policy_sync'] or
+        module.params['test_template_sync']
+    ):
+        if not HAS_XMLTODICT:
+            module.fail_json(msg='Missing required libraries: xmltodict')
+
+        connect = partial(
+            PanDevice.create_from_device,
+            module.params['ip_address'],
+            module.params['username'],
+            module.params['password']
+        )
+
+        try:
+            device_tester = ManagedDeviceIndex.from_device(connect())
+        except Exception as e:
+            if not module.params['watch']:
+                module.fail_json(msg=str(e))
+            # Panorama may still be settling after an upgrade or failover, build the index on the first retry
+            device_tester = ManagedDeviceIndex.deferred(connect, str(e))
+
+    # Each requested test keyed by its module parameter, in execution order
+    tests = OrderedDict()
 
     # Panorama Tests
 
     if module.params['test_devices_connected']:
-        output = pano_tester.t_devices_connected(module.params['test_devices_connected'])
-        test_output_list.append(output)
+        tests['test_devices_connected'] = partial(device_tester.t_devices_connected, module.params['test_devices_connected'])
 
     if module.params['test_log_collectors_connected']:
-        output = pano_tester.t_log_collectors_connected(module.params['test_log_collectors_connected'])
-        test_output_list.append(output)
+        tests['test_log_collectors_connected'] = partial(pano_tester.t_log_collectors_connected, module.params['test_log_collectors_connected'])
 
     if module.params['test_wf_appliances_connected']:
-        output = pano_tester.t_wf_appliances_connected(module.params['test_wf_appliances_connected'])
-        test_output_list.append(output)
+        tests['test_wf_appliances_connected'] = partial(pano_tester.t_wf_appliances_connected, module.params['test_wf_appliances_connected'])
 
     if module.params['test_shared_policy_sync']:
-        output = pano_tester.t_shared_policy_sync(module.params['test_shared_policy_sync'])
-        test_output_list.append(output)
+        tests['test_shared_policy_sync'] = partial(device_tester.t_shared_policy_sync, module.params['test_shared_policy_sync'])
 
     if module.params['test_template_sync']:
-        output = pano_tester.t_template_sync(module.params['test_template_sync'])
-        test_output_list.append(output)
+        tests['test_template_sync'] = partial(device_tester.t_template_sync, module.params['test_template_sync'])
 
     if module.params['test_log_collector_config_sync']:
-        output = pano_tester.t_log_collector_config_sync(module.params['test_log_collector_config_sync'])
-        test_output_list.append(output)
+        tests['test_log_collector_config_sync'] = partial(pano_tester.t_log_collector_config_sync, module.params['test_log_collector_config_sync'])
 
     if module.params['test_wf_appliance_config_sync']:
-        output = pano_tester.t_wf_appliance_config_sync(module.params['test_wf_appliance_config_sync'])
-        test_output_list.append(output)
+        tests['test_wf_appliance_config_sync'] = partial(pano_tester.t_wf_appliance_config_sync, module.params['test_wf_appliance_config_sync'])
 
     if module.params['test_ha_peer_up_pano']:
-        output = pano_tester.t_ha_peer_up_pano(module.params['test_ha_peer_up_pano'])
-        test_output_list.append(output)
+        tests['test_ha_peer_up_pano'] = partial(pano_tester.t_ha_peer_up_pano, module.params['test_ha_peer_up_pano'])
 
     if module.params['test_ha_match_pano']:
-        output = pano_tester.t_ha_match_pano(module.params['test_ha_match_pano'])
-        test_output_list.append(output)
+        tests['test_ha_match_pano'] = partial(pano_tester.t_ha_match_pano, module.params['test_ha_match_pano'])
 
     if module.params['test_ha_config_synced_pano']:
-        output = pano_tester.t_ha_config_synced_pano(module.params['test_ha_config_synced_pano'])
-        test_output_list.append(output)
+        tests['test_ha_config_synced_pano'] = partial(pano_tester.t_ha_config_synced_pano, module.params['test_ha_config_synced_pano'])
 
     if module.params['test_system_env_alarms_pano']:
-        output = pano_tester.t_system_env_alarms_pano(str(module.params['test_system_env_alarms_pano']))
-        test_output_list.append(output)
+        tests['test_system_env_alarms_pano'] = partial(pano_tester.t_system_env_alarms_pano, str(module.params['test_system_env_alarms_pano']))
 
     # Firewall Tests
 
     if module.params['test_panorama_connected']:
-        output = fw_tester.t_panorama_connected(module.params['test_panorama_connected'])
-        test_output_list.append(output)
+        tests['test_panorama_connected'] = partial(fw_tester.t_panorama_connected, module.params['test_panorama_connected'])
 
     if module.params['test_interfaces_up']:
-        output = fw_tester.t_interfaces_up(module.params['test_interfaces_up'])
-        test_output_list.append(output)
+        tests['test_interfaces_up'] = partial(fw_tester.t_interfaces_up, module.params['test_interfaces_up'])
+
+    if module.params['test_interface_state']:
+        if not HAS_XMLTODICT:
+            module.fail_json(msg='Missing required libraries: xmltodict')
+
+        try:
+            fw_device = PanDevice.create_from_device(
+                module.params['ip_address'],
+                module.params['username'],
+                module.params['password']
+            )
+        except PanDeviceError as e:
+            module.fail_json(msg=str(e))
+
+        tests['test_interface_state'] = partial(t_interface_state, fw_device, module.params['test_interface_state'])
 
     if module.params['test_ha_peer_up']:
-        output = fw_tester.t_ha_peer_up(module.params['test_ha_peer_up'])
-        test_output_list.append(output)
+        tests['test_ha_peer_up'] = partial(fw_tester.t_ha_peer_up, module.params['test_ha_peer_up'])
 
     if module.params['test_ha_match']:
-        output = fw_tester.t_ha_match(module.params['test_ha_match'])
-        test_output_list.append(output)
+        tests['test_ha_match'] = partial(fw_tester.t_ha_match, module.params['test_ha_match'])
 
     if module.params['test_ha_config_synced']:
-        output = fw_tester.t_ha_config_synced(module.params['test_ha_config_synced'])
-        test_output_list.append(output)
+        tests['test_ha_config_synced'] = partial(fw_tester.t_ha_config_synced, module.params['test_ha_config_synced'])
 
     if module.params['test_system_env_alarms_fw']:
-        output = fw_tester.t_system_env_alarms_fw(str(module.params['test_system_env_alarms_fw']))
-        test_output_list.append(output)
+        tests['test_system_env_alarms_fw'] = partial(fw_tester.t_system_env_alarms_fw, str(module.params['test_system_env_alarms_fw']))
 
     if module.params['test_routes']:
-        output = fw_tester.t_routes(module.params['test_routes'])
-        test_output_list.append(output)
+        tests['test_routes'] = partial(fw_tester.t_routes, module.params['test_routes'])
 
     if module.params['test_connectivity']:
-        output = fw_tester.t_connectivity(module.params['test_connectivity'])
-        test_output_list.append(output)
+        tests['test_connectivity'] = partial(fw_tester.t_connectivity, module.params['test_connectivity'])
 
     if module.params['test_traffic_log_forward']:
-        output = fw_tester.t_traffic_log_forward()
-        test_output_list.append(output)
+        tests['test_traffic_log_forward'] = partial(fw_tester.t_traffic_log_forward)
 
     # General Tests
 
     if module.params['test_ha_enabled']:
-        output = gen_tester.t_ha_enabled(module.params['test_ha_enabled'])
-        test_output_list.append(output)
+        tests['test_ha_enabled'] = partial(gen_tester.t_ha_enabled, module.params['test_ha_enabled'])
 
     if module.params['test_system_version']:
-        output = gen_tester.t_system_version(module.params['test_system_version'])
-        test_output_list.append(output)
+        tests['test_system_version'] = partial(gen_tester.t_system_version, module.params['test_system_version'])
 
     if module.params['test_config_diff']:
         if 'config_set' in module.params['test_config_diff']:
             with open(module.params['test_config_diff'], 'r') as file_obj:
                 config_set_list = file_obj.read().decode('utf-8').splitlines()
 
-            output = gen_tester.t_config_diff(config_set_list)
+            tests['test_config_diff'] = partial(gen_tester.t_config_diff, config_set_list)
         else:
-            output = gen_tester.t_config_diff(module.params['test_config_diff'])
-
-        test_output_list.append(output)
+            tests['test_config_diff'] = partial(gen_tester.t_config_diff, module.params['test_config_diff'])
+
+    if module.params['schedule']:
+        costs = dict(DEFAULT_TEST_COSTS)
+        if module.params['cost_file']:
+            costs.update(load_test_costs(module.params['cost_file']))
+        for param, cost in (module.params['test_costs'] or {}).items():
+            try:
+                costs[param] = float(cost)
+            except (TypeError, ValueError):
+                module.fail_json(msg='Invalid cost for {} in test_costs: {}'.format(param, cost))
+
+        test_order = schedule_tests(list(tests), module.params['critical_tests'], costs)
+    else:
+        test_order = list(tests)
+
+    test_outputs, durations, result['skipped_tests'] = run_tests(
+        tests,
+        test_order,
+        critical_tests=module.params['critical_tests'],
+        fail_fast=module.params['fail_fast'],
+        catch_errors=module.params['watch']
+    )
 
-    result['stdout'] = json.dumps(test_output_list, indent=4, default=set_default)
+    if module.params['watch']:
+        watch_started = time.time()
+        before_retry = device_tester.refresh if device_tester is not pano_tester else None
+
+        result['convergence'] = watch_tests(
+            tests,
+            test_outputs,
+            module.params['watch_timeout'],
+            module.params['watch_interval'],
+            module.params['watch_max_interval'],
+            before_retry=before_retry
+        )
+
+        # Critical tests have recovered, run the tests fail-fast skipped for the rest of the timeout
+        if result['skipped_tests'] and all(
+            output['result'] for param, output in test_outputs.items() if param in module.params['critical_tests']
+        ):
+            skipped_outputs, skipped_durations, _ = run_tests(tests, result['skipped_tests'], catch_errors=True)
+            durations.update(skipped_durations)
+            result['skipped_tests'] = []
+
+            result['convergence'].update(watch_tests(
+                tests,
+                skipped_outputs,
+                max(0, module.params['watch_timeout'] - (time.time() - watch_started)),
+                module.params['watch_interval'],
+                module.params['watch_max_interval'],
+                before_retry=before_retry
+            ))
+            test_outputs.update(skipped_outputs)
+
+    result['durations'] = dict((param, round(seconds, 3)) for param, seconds in durations.items())
+
+    if module.params['cost_file']:
+        try:
+            save_test_costs(module.params['cost_file'], durations)
+        except (IOError, OSError) as e:
+            module.warn('Unable to write test costs to {}: {}'.format(module.params['cost_file'], e))
+
+    test_output_list = list(test_outputs.values())
+
+    if module.params['output_format'] == 'compact':
+        result['summary'] = summarize_tests(test_outputs, result['skipped_tests'])
+        result['detail_file'] = module.params['detail_file'] or '{}_{}_tvt_detail.json'.format(
+            module.params['ip_address'], datetime.now().strftime(r'%y%m%d_%H%M')
+        )
+
+        try:
+            with open(result['detail_file'], 'w') as file_obj:
+                json.dump(test_output_list, file_obj, separators=(',', ':'), default=set_default)
+        except (IOError, OSError) as e:
+            module.fail_json(msg='Unable to write test detail to {}: {}'.format(result['detail_file'], e))
+
+        result['stdout'] = json.dumps(
+            [{'name': test['name'], 'result': test['result']} for test in test_output_list], separators=(',', ':')
+        )
+    else:
+        result['stdout'] = json.dumps(test_output_list, indent=4, default=set_default)
+
+    # Per-test detail stays in stdout or detail_file, the log only points at it
+    emit_results(module, 'panos_test', [
+        {
+            'param': param,
+            'name': output['name'],
+            'result': output['result'],
+            'duration': result['durations'].get(param),
+            'detail_file': result['detail_file'] or None
+        } for param, output in test_outputs.items()
+    ] + [{'param': param, 'skipped': True} for param in result['skipped_tests']])
+
+    # An incomplete test-suite never passes
+    if result['skipped_tests']:
+        result['message'] = 'FAIL'
+        module.exit_json(**result)
 
     for test in test_output_list:
         if not test['result']: